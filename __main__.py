@@ -1,52 +1,82 @@
 # focusbox/__main__.py
 
 from datetime import datetime, timedelta
+import logging
+import signal
 import time
 
-from dateutil.tz import gettz
-
-from .config import CALENDAR_REFRESH_INTERVAL, LOCAL_TZ
-from .google_calendar import fetch_events, build_schedule
+from .config import CALENDAR_REFRESH_INTERVAL, EMERGENCY_BUTTON_PIN
+from .google_calendar import _LOCAL_TZ, fetch_events, build_schedule
 from .scheduler import FocusBoxStateMachine
 from .box import BoxHardware
 
+logger = logging.getLogger(__name__)
+
 
 def main():
-    local_tz = gettz(LOCAL_TZ)
+    # INFO by default: per-poll sensor readings are DEBUG and never formatted
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s %(levelname)s %(message)s",
+    )
 
     # Hardware interface (motors + sensors via robot_hat)
-    box = BoxHardware()
+    box = BoxHardware(emergency_pin=EMERGENCY_BUTTON_PIN)
 
     # State machine (uses robot_hat Music internally)
     fsm = FocusBoxStateMachine(box=box)
 
+    # Sensor reads run in the background; each new reading wakes the loop
+    box.start_sensor_thread(on_reading=fsm.wake)
+
+    # Emergency button interrupt -> flag + wake; the unlock itself runs in
+    # fsm.update() on this thread
+    box.set_emergency_handler(fsm.request_emergency_unlock)
+
     schedule = []
-    last_fetch = datetime.min.replace(tzinfo=local_tz)
+    # Refresh cadence on the monotonic clock (NTP/DST jumps don't affect it)
+    refresh_s = CALENDAR_REFRESH_INTERVAL.total_seconds()
+    last_fetch_mono = None
 
-    print("[Main] Focus Box started. Press Ctrl+C to exit.")
+    # Ctrl+C raises KeyboardInterrupt (also out of fsm.wait() and a blocked
+    # calendar fetch / OAuth flow). Make SIGTERM (systemd stop) do the same
+    # kind of unwind so the box still unlocks on exit.
+    def _on_sigterm(signum, frame):
+        raise SystemExit(0)
+
+    signal.signal(signal.SIGTERM, _on_sigterm)
+
+    logger.info("[Main] Focus Box started. Press Ctrl+C to exit.")
 
     try:
         while True:
-            now = datetime.now(tz=local_tz)
+            now = datetime.now(tz=_LOCAL_TZ)
+            mono = time.monotonic()
 
             # Periodically refresh today's calendar schedule
-            if now - last_fetch > CALENDAR_REFRESH_INTERVAL:
+            if last_fetch_mono is None or mono - last_fetch_mono > refresh_s:
                 start = now.replace(hour=0, minute=0, second=0, microsecond=0)
                 end = start + timedelta(days=1)
 
                 events = fetch_events(start, end)
                 schedule = build_schedule(events)
-                last_fetch = now
+                last_fetch_mono = mono
 
             # Update state machine (handles phone placement + lock + sounds)
             fsm.update(now, schedule)
 
-            # Run more frequently for responsiveness.
-            # Phone detection polling rate is controlled inside scheduler.py (phone_poll_period_s).
-            time.sleep(0.2)
+            # Sleep until the next thing that needs attention: sensor poll,
+            # schedule boundary or calendar refresh. fsm.wake() cuts it short.
+            # Fresh timestamps: a slow fetch above must not push us past a boundary.
+            until_refresh = refresh_s - (time.monotonic() - last_fetch_mono)
+            until_next = fsm.next_wake_seconds(datetime.now(tz=_LOCAL_TZ), schedule)
+            fsm.wait(min(until_next, until_refresh))
 
     except KeyboardInterrupt:
-        print("\n[Main] Exiting...")
+        pass
+
+    finally:
+        logger.info("[Main] Exiting...")
         # optional: ensure unlocked on exit
         try:
             box.unlock()
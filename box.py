@@ -7,13 +7,21 @@ Reuses the same wiring style as PiCar-X:
   (left_dir, right_dir, left_pwm, right_pwm)
 - grayscale_pins default: ['A0','A1','A2']
 - ultrasonic_pins default: ['D2','D3'] (trig, echo)
+- emergency_pin default: None (optional push button to GND, active low)
 
 Main API:
     box = BoxHardware(...)
     box.lock()
     box.unlock()
+    box.lock_async()    # motors run in the background; box.wait_lock_done()
     present = box.is_phone_present()
 
+    # Non-blocking variant (sensor read on a background thread):
+    box.start_sensor_thread()
+    box.request_phone_reading()
+    present, age_s = box.is_phone_present_nonblocking()
+    box.set_emergency_handler(fsm.request_emergency_unlock)   # button edge -> callback
+
 Notes on phone detection:
 - Ultrasonic is usually better for "is something inside the box" because it measures distance.
 - Grayscale is reflectance-based; it can work if mounted close to where the phone sits and calibrated.
@@ -21,14 +29,23 @@ Notes on phone detection:
 
 from __future__ import annotations
 
+import ast
+import json
+import logging
 import os
+import pwd
+import threading
 import time
 from dataclasses import dataclass
-from typing import List, Literal, Optional
+from typing import Callable, List, Literal, Optional, Tuple
+
+import numpy as np
 
 from robot_hat import Pin, ADC, PWM, Servo, fileDB
 from robot_hat import Grayscale_Module, Ultrasonic, utils
 
+logger = logging.getLogger(__name__)
+
 
 def constrain(x, lo, hi):
     return max(lo, min(hi, x))
@@ -40,8 +57,9 @@ class PhoneDetectConfig:
 
     # Ultrasonic: phone present if distance <= threshold_cm
     ultrasonic_threshold_cm: float = 10.0
+    # Up to N readings; stops at the first one under the threshold.
     ultrasonic_samples: int = 3
-    ultrasonic_delay_s: float = 0.05
+    ultrasonic_delay_s: float = 0.01    # HC-SR04 needs ~10ms between triggers
 
     # Grayscale: phone present if (avg reading) crosses threshold
     # You must calibrate this based on your mounting + phone surface.
@@ -50,6 +68,9 @@ class PhoneDetectConfig:
     grayscale_samples: int = 5
     grayscale_delay_s: float = 0.02
 
+    # Reuse the last result if it is younger than this (0 disables)
+    cache_ttl_s: float = 0.5
+
 
 class BoxHardware:
     CONFIG = "/opt/focusbox/focusbox.conf"
@@ -58,11 +79,16 @@ class BoxHardware:
     PERIOD = 4095
     PRESCALER = 10
 
+    # Write the stop twice (same as PiCarX) so a missed write cannot leave
+    # the motors pulling the lock string. Tested setups may turn it off.
+    STOP_REDUNDANT = True
+
     def __init__(
         self,
         motor_pins: List[str] = ["D4", "D5", "P13", "P12"],
         grayscale_pins: List[str] = ["A0", "A1", "A2"],
         ultrasonic_pins: List[str] = ["D2", "D3"],
+        emergency_pin: Optional[str] = None,
         config_path: str = CONFIG,
         detect: PhoneDetectConfig = PhoneDetectConfig(),
         # Lock motion tuning:
@@ -78,8 +104,13 @@ class BoxHardware:
         self.detect_cfg = detect
 
         # Config DB (same as PiCarX)
-        os.makedirs(os.path.dirname(config_path), exist_ok=True)
-        self.config_file = fileDB(config_path, 0o777, os.getlogin())
+        # Owner from the uid, not os.getlogin(): the latter fails without a
+        # controlling TTY (systemd / cron boot).
+        config_dir = os.path.dirname(config_path)
+        if not os.path.isdir(config_dir):
+            os.makedirs(config_dir, exist_ok=True)
+        owner = pwd.getpwuid(os.getuid()).pw_name
+        self.config_file = fileDB(config_path, 0o777, owner)
 
         # ---- motors init (mirrors PiCarX wiring & calibration) ----
         self.left_dir = Pin(motor_pins[0])
@@ -92,7 +123,7 @@ class BoxHardware:
 
         # Load motor direction calibration (same key as PiCarX)
         cali_dir = self.config_file.get("picarx_dir_motor", default_value="[1, 1]")
-        self.cali_dir_value = [int(i.strip()) for i in cali_dir.strip().strip("[]").split(",")]
+        self.cali_dir_value = [int(i) for i in ast.literal_eval(cali_dir)]
 
         # Speed calibration (keep simple, you can extend later)
         self.cali_speed_value = [0, 0]
@@ -103,15 +134,17 @@ class BoxHardware:
 
         # ---- sensors init ----
         # Grayscale module
-        adc0, adc1, adc2 = [ADC(pin) for pin in grayscale_pins]
+        adc0, adc1, adc2 = (ADC(pin) for pin in grayscale_pins)
         self.grayscale = Grayscale_Module(adc0, adc1, adc2, reference=None)
+        # Reused sample buffer for _phone_present_grayscale (samples x 3 channels)
+        self._gs_buf = np.empty((max(1, detect.grayscale_samples), 3), dtype=np.float32)
 
         # Allow storing a grayscale reference (optional)
         # If you used PiCarX before, these keys may already exist in the config.
         ref = self.config_file.get("focusbox_grayscale_ref", default_value="")
         if ref:
             try:
-                ref_list = [float(i) for i in ref.strip().strip("[]").split(",")]
+                ref_list = [float(i) for i in json.loads(ref)]
                 if len(ref_list) == 3:
                     self.grayscale.reference(ref_list)
             except Exception:
@@ -121,6 +154,17 @@ class BoxHardware:
         trig, echo = ultrasonic_pins
         self.ultrasonic = Ultrasonic(Pin(trig), Pin(echo, mode=Pin.IN, pull=Pin.PULL_DOWN))
 
+        # Emergency button: edge interrupt instead of polling from the main loop
+        self._emergency_handler: Optional[Callable[[], None]] = None
+        self.emergency_button = None
+        if emergency_pin is not None:
+            self.emergency_button = Pin(emergency_pin, mode=Pin.IN, pull=Pin.PULL_UP)
+            self.emergency_button.irq(
+                handler=self._on_emergency_irq,
+                trigger=Pin.IRQ_FALLING,
+                bouncetime=200,
+            )
+
         # ---- lock tuning ----
         self.lock_speed = constrain(lock_speed, 0, 100)
         self.unlock_speed = constrain(unlock_speed, 0, 100)
@@ -128,6 +172,16 @@ class BoxHardware:
         self.unlock_duration_s = max(0.0, unlock_duration_s)
 
         self._locked = False
+        # Serializes motor runs (lock_async thread vs. unlock from other callers)
+        self._motor_lock = threading.Lock()
+        self._lock_thread: Optional[threading.Thread] = None
+
+        # ---- background phone detection (see start_sensor_thread) ----
+        self._presence_lock = threading.Lock()
+        self._latest_presence: Optional[Tuple[bool, float]] = None  # (present, monotonic ts)
+        self._sensor_trigger = threading.Event()
+        self._sensor_thread: Optional[threading.Thread] = None
+        self._on_reading: Optional[Callable[[], None]] = None
 
     # ---------------- Motor control (adapted from PiCarX) ----------------
 
@@ -165,8 +219,8 @@ class BoxHardware:
             self.motor_speed_pins[m].pulse_width_percent(pwm_percent)
 
     def stop_motors(self):
-        # Execute twice (same as PiCarX) for better stop reliability
-        for _ in range(2):
+        # One write per pin; twice (same as PiCarX) if STOP_REDUNDANT
+        for _ in range(2 if self.STOP_REDUNDANT else 1):
             self.motor_speed_pins[0].pulse_width_percent(0)
             self.motor_speed_pins[1].pulse_width_percent(0)
             time.sleep(0.002)
@@ -188,27 +242,55 @@ class BoxHardware:
         Pull string to lock lid. Assumes positive speed pulls in the lock direction.
         If your winding direction is opposite, swap signs or flip calibration.
         """
-        if self._locked:
-            return
+        with self._motor_lock:
+            if self._locked:
+                return
 
-        # Run both motors same direction to pull string
-        s = int(self.lock_speed)
-        self._run_both_motors(+s, +s, self.lock_duration_s)
-        self._locked = True
-        print("[Box] LOCKED")
+            # Run both motors same direction to pull string
+            s = int(self.lock_speed)
+            self._run_both_motors(+s, +s, self.lock_duration_s)
+            self._locked = True
+        logger.info("[Box] LOCKED")
+
+    def lock_async(self) -> threading.Thread:
+        """
+        Run lock() on a background thread and return it, so the caller can
+        keep going (e.g. play a sound) while the motors pull.
+        If a lock is already in progress, returns that thread.
+        """
+        if self._lock_thread is None or not self._lock_thread.is_alive():
+            self._lock_thread = threading.Thread(
+                target=self.lock, name="focusbox-lock", daemon=True
+            )
+            self._lock_thread.start()
+        return self._lock_thread
+
+    def wait_lock_done(self, timeout: Optional[float] = None) -> bool:
+        """
+        Wait for a pending lock_async() to finish. Returns True if none is running.
+        """
+        t = self._lock_thread
+        if t is not None:
+            t.join(timeout)
+            return not t.is_alive()
+        return True
 
     def unlock(self):
         """
         Release string to unlock lid. Assumes negative speed releases.
         If opposite, swap signs.
         """
-        if not self._locked:
-            return
-
-        s = int(self.unlock_speed)
-        self._run_both_motors(-s, -s, self.unlock_duration_s)
-        self._locked = False
-        print("[Box] UNLOCKED")
+        # Let a pending lock_async() finish first, even one whose thread has
+        # not taken _motor_lock yet; otherwise it would lock after we return.
+        self.wait_lock_done()
+        with self._motor_lock:
+            if not self._locked:
+                return
+
+            s = int(self.unlock_speed)
+            self._run_both_motors(-s, -s, self.unlock_duration_s)
+            self._locked = False
+        logger.info("[Box] UNLOCKED")
 
     # ---------------- Phone detection ----------------
 
@@ -234,45 +316,141 @@ class BoxHardware:
 
         Grayscale:
           - works only if close to phone surface & calibrated
+
+        A result younger than detect_cfg.cache_ttl_s is returned without
+        touching the sensor.
         """
-        if self.detect_cfg.sensor == "ultrasonic":
-            return self._phone_present_ultrasonic()
+        with self._presence_lock:
+            cached = self._latest_presence
+        if cached is not None and time.monotonic() - cached[1] < self.detect_cfg.cache_ttl_s:
+            return cached[0]
+        return self._measure_phone_presence()
 
-        if self.detect_cfg.sensor == "grayscale":
-            return self._phone_present_grayscale()
+    def _measure_phone_presence(self) -> bool:
+        """
+        Uncached sensor read; stores the result in _latest_presence.
+        """
+        if self.detect_cfg.sensor == "ultrasonic":
+            present = self._phone_present_ultrasonic()
+        elif self.detect_cfg.sensor == "grayscale":
+            present = self._phone_present_grayscale()
+        else:
+            raise ValueError(f"Unknown sensor mode: {self.detect_cfg.sensor}")
 
-        raise ValueError(f"Unknown sensor mode: {self.detect_cfg.sensor}")
+        with self._presence_lock:
+            self._latest_presence = (present, time.monotonic())
+        return present
 
     def _phone_present_ultrasonic(self) -> bool:
-        samples = []
-        for _ in range(max(1, self.detect_cfg.ultrasonic_samples)):
+        # robust-ish: use min distance (object presence tends to drop distance),
+        # but stop as soon as one valid reading is already under the threshold.
+        n = max(1, self.detect_cfg.ultrasonic_samples)
+        d_min = float("inf")
+        for i in range(n):
+            if i:
+                time.sleep(self.detect_cfg.ultrasonic_delay_s)
             d = self.get_distance_cm()
-            samples.append(d)
-            time.sleep(self.detect_cfg.ultrasonic_delay_s)
+            if d < 0:
+                # robot_hat returns negative values on timeout -> not a reading
+                continue
+            d_min = min(d_min, d)
+            if d_min <= self.detect_cfg.ultrasonic_threshold_cm:
+                break
 
-        # robust-ish: use min distance (object presence tends to drop distance)
-        d_min = min(samples)
         present = d_min <= self.detect_cfg.ultrasonic_threshold_cm
-        print(f"[Box] Ultrasonic d_min={d_min:.2f}cm -> present={present}")
+        logger.debug("[Box] Ultrasonic d_min=%.2fcm -> present=%s", d_min, present)
         return present
 
     def _phone_present_grayscale(self) -> bool:
-        avgs = []
-        for _ in range(max(1, self.detect_cfg.grayscale_samples)):
-            vals = self.get_grayscale()
-            avg = sum(vals) / 3.0
-            avgs.append(avg)
+        n = max(1, self.detect_cfg.grayscale_samples)
+        if self._gs_buf.shape[0] < n:
+            self._gs_buf = np.empty((n, 3), dtype=np.float32)
+        for i in range(n):
+            self._gs_buf[i] = self.grayscale.read()
             time.sleep(self.detect_cfg.grayscale_delay_s)
 
-        avg_mean = sum(avgs) / len(avgs)
+        # mean of per-sample averages == mean over all n x 3 values
+        avg_mean = float(self._gs_buf[:n].mean())
 
         # Depending on mounting, "present" might mean avg goes UP or DOWN.
         # This default assumes avg gets LOWER when phone is close (common with some reflectance setups).
         # If your readings increase instead, flip the comparator.
         present = avg_mean <= self.detect_cfg.grayscale_threshold
-        print(f"[Box] Grayscale avg={avg_mean:.1f} -> present={present}")
+        logger.debug("[Box] Grayscale avg=%.1f -> present=%s", avg_mean, present)
         return present
 
+    # ---------------- Emergency button ----------------
+
+    def set_emergency_handler(self, handler: Optional[Callable[[], None]]):
+        """
+        Register the callback run (on the GPIO interrupt thread) when the
+        emergency button is pressed, e.g. fsm.request_emergency_unlock.
+        Keep it short and thread-safe: it does not run on the main thread.
+        """
+        self._emergency_handler = handler
+
+    def _on_emergency_irq(self, *_args):
+        logger.warning("[Box] Emergency button pressed")
+        handler = self._emergency_handler
+        if handler is not None:
+            handler()
+
+    # ---------------- Background phone detection ----------------
+
+    def start_sensor_thread(self, interval_s: Optional[float] = None,
+                            on_reading: Optional[Callable[[], None]] = None):
+        """
+        Run phone detection on a background thread so callers never block on
+        the sensor burst. The thread reads whenever request_phone_reading()
+        is called, and also every `interval_s` seconds if given.
+        `on_reading()` is called after each new reading (e.g. to wake a loop).
+        """
+        if self._sensor_thread is not None and self._sensor_thread.is_alive():
+            return
+        self._on_reading = on_reading
+        self._sensor_thread = threading.Thread(
+            target=self._sensor_loop, args=(interval_s,),
+            name="focusbox-sensor", daemon=True,
+        )
+        self._sensor_thread.start()
+
+    def request_phone_reading(self):
+        """
+        Ask for a fresh reading. Returns immediately if the sensor thread is
+        running; otherwise reads synchronously.
+        """
+        if self._sensor_thread is not None and self._sensor_thread.is_alive():
+            self._sensor_trigger.set()
+        else:
+            self._read_phone_presence()
+
+    def is_phone_present_nonblocking(self) -> Tuple[Optional[bool], float]:
+        """
+        Latest reading as (present, age_seconds); (None, inf) if there is none yet.
+        """
+        with self._presence_lock:
+            latest = self._latest_presence
+        if latest is None:
+            return None, float("inf")
+        present, ts = latest
+        return present, time.monotonic() - ts
+
+    def _sensor_loop(self, interval_s: Optional[float]):
+        while True:
+            self._sensor_trigger.wait(timeout=interval_s)
+            self._sensor_trigger.clear()
+            self._read_phone_presence()
+
+    def _read_phone_presence(self):
+        # Explicitly requested -> always measure (bypasses the TTL memo)
+        try:
+            self._measure_phone_presence()
+        except Exception as e:
+            logger.error("[Box] Phone detect error: %s", e)
+            return
+        if self._on_reading is not None:
+            self._on_reading()
+
     # ---------------- Optional helpers ----------------
 
     def set_grayscale_reference(self, ref3: List[float]):
@@ -282,8 +460,8 @@ class BoxHardware:
         if not (isinstance(ref3, list) and len(ref3) == 3):
             raise ValueError("ref3 must be a list of 3 numbers")
         self.grayscale.reference(ref3)
-        self.config_file.set("focusbox_grayscale_ref", str(ref3))
-        print(f"[Box] Saved grayscale reference: {ref3}")
+        self.config_file.set("focusbox_grayscale_ref", json.dumps(ref3))
+        logger.info("[Box] Saved grayscale reference: %s", ref3)
 
 
 # Simple manual test
@@ -21,5 +21,8 @@ SLEEP_KEYWORD = "SLEEP"
 LOCK_ENABLED = True
 LOCK_ACTIVE_HIGH = True     # True：输出高电平上锁；False：低电平上锁
 
+# 紧急解锁按钮（默认 Robot HAT 板载 USR 键，按下接地）；设为 None 则不启用
+EMERGENCY_BUTTON_PIN = "SW"
+
 # 显示屏配置（后续接 OLED/e-ink 时用）
 DISPLAY_ENABLED = True
@@ -1,18 +1,19 @@
 # focusbox/google_calendar.py
 
 from __future__ import annotations
-from typing import List, Tuple
+from typing import TYPE_CHECKING, List, Tuple
 from datetime import datetime, timezone
 
+import logging
 import os.path
+import sys
 
 from dateutil.parser import isoparse
 from dateutil.tz import gettz
 
-from google.auth.transport.requests import Request
-from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import InstalledAppFlow
-from googleapiclient.discovery import build
+# google.* / googleapiclient 导入很重（Pi 上几秒），放到第一次用到时再导入
+if TYPE_CHECKING:
+    from google.oauth2.credentials import Credentials
 
 from .config import (
     GOOGLE_SCOPES,
@@ -23,19 +24,45 @@ from .config import (
     LOCAL_TZ,
 )
 
+logger = logging.getLogger(__name__)
+
+# 本地时区只解析一次
+_LOCAL_TZ = gettz(LOCAL_TZ) or timezone.utc
+
+# summary 关键字 → mode（按顺序匹配，FOCUS 优先）
+_MODE_KEYWORDS = (
+    (FOCUS_KEYWORD, "FOCUS"),
+    (SLEEP_KEYWORD, "SLEEP"),
+)
+
+# RFC3339 / 日期字符串解析：3.11+ 的 datetime.fromisoformat 是 C 实现，
+# 支持 "Z"、偏移量和纯日期；更老的 Python 退回 dateutil.isoparse
+if sys.version_info >= (3, 11):
+    _parse_datetime = datetime.fromisoformat
+else:
+    _parse_datetime = isoparse
+
+# 缓存已构建的 Calendar service（凭据过期才重建）
+_SERVICE = None
+_SERVICE_CREDS = None
+
 # --------- A. 获取/刷新 Credentials --------- #
 
 def get_credentials() -> Credentials:
+    from google.auth.transport.requests import Request
+    from google.oauth2.credentials import Credentials
+    from google_auth_oauthlib.flow import InstalledAppFlow
+
     creds = None
     if os.path.exists(GOOGLE_TOKEN_FILE):
         creds = Credentials.from_authorized_user_file(GOOGLE_TOKEN_FILE, GOOGLE_SCOPES)
     # 没有 token 或 token 失效，就重新走 OAuth
     if not creds or not creds.valid:
         if creds and creds.expired and creds.refresh_token:
-            print("[Google] Refreshing access token...")
+            logger.info("[Google] Refreshing access token...")
             creds.refresh(Request())
         else:
-            print("[Google] Running OAuth flow...")
+            logger.info("[Google] Running OAuth flow...")
             flow = InstalledAppFlow.from_client_secrets_file(
                 GOOGLE_CREDENTIALS_FILE, GOOGLE_SCOPES
             )
@@ -43,7 +70,7 @@ def get_credentials() -> Credentials:
         # 保存 token
         with open(GOOGLE_TOKEN_FILE, "w") as token:
             token.write(creds.to_json())
-            print(f"[Google] Saved token to {GOOGLE_TOKEN_FILE}")
+            logger.info("[Google] Saved token to %s", GOOGLE_TOKEN_FILE)
     return creds
 
 
@@ -54,8 +81,7 @@ def fetch_events(time_min: datetime, time_max: datetime):
     在 [time_min, time_max) 区间内获取事件。
     time_min/time_max 必须是 aware datetime（含时区）。
     """
-    creds = get_credentials()
-    service = build("calendar", "v3", credentials=creds)
+    service = _get_service()
 
     events_result = service.events().list(
         calendarId="primary",
@@ -63,13 +89,36 @@ def fetch_events(time_min: datetime, time_max: datetime):
         timeMax=time_max.isoformat(),
         singleEvents=True,
         orderBy="startTime",
+        maxResults=250,
+        timeZone=LOCAL_TZ,
+        # 只下载 build_schedule 用到的字段
+        fields="items(summary,start(date,dateTime),end(date,dateTime))",
     ).execute()
 
     items = events_result.get("items", [])
-    print(f"[Google] Fetched {len(items)} events.")
+    logger.info("[Google] Fetched %d events.", len(items))
     return items
 
 
+def _get_service():
+    """
+    复用同一个 service；只有在没有 service 或凭据失效时才重新构建。
+    static_discovery 使用库内置的 discovery 文档，省掉一次 HTTP 请求。
+    """
+    global _SERVICE, _SERVICE_CREDS
+    if _SERVICE is None or _SERVICE_CREDS is None or not _SERVICE_CREDS.valid:
+        from googleapiclient.discovery import build
+
+        _SERVICE_CREDS = get_credentials()
+        _SERVICE = build(
+            "calendar", "v3",
+            credentials=_SERVICE_CREDS,
+            cache_discovery=False,
+            static_discovery=True,
+        )
+    return _SERVICE
+
+
 # --------- C. 解析事件 → 内部 schedule 结构 --------- #
 
 class ScheduledBlock:
@@ -94,20 +143,25 @@ def build_schedule(events) -> List[ScheduledBlock]:
     匹配规则：summary 里包含 FOCUS 或 SLEEP（大小写不敏感）。
     """
     schedule: List[ScheduledBlock] = []
-    local_tz = gettz(LOCAL_TZ)
+    local_tz = _LOCAL_TZ
 
     for e in events:
         summary = (e.get("summary") or "").strip()
         summary_upper = summary.upper()
 
+        # 先做便宜的关键字匹配，不相关的事件不去解析时间
+        mode = next((m for kw, m in _MODE_KEYWORDS if kw in summary_upper), None)
+        if mode is None:
+            continue
+
         start_raw = e["start"].get("dateTime") or e["start"].get("date")
         end_raw = e["end"].get("dateTime") or e["end"].get("date")
 
         if not start_raw or not end_raw:
             continue
 
-        start = isoparse(start_raw)
-        end = isoparse(end_raw)
+        start = _parse_datetime(start_raw)
+        end = _parse_datetime(end_raw)
 
         # 统一转到本地时区
         if start.tzinfo is None:
@@ -118,17 +172,10 @@ def build_schedule(events) -> List[ScheduledBlock]:
         start = start.astimezone(local_tz)
         end = end.astimezone(local_tz)
 
-        mode = None
-        if FOCUS_KEYWORD in summary_upper:
-            mode = "FOCUS"
-        elif SLEEP_KEYWORD in summary_upper:
-            mode = "SLEEP"
-
-        if mode is None:
-            continue
-
         block = ScheduledBlock(mode=mode, title=summary, start=start, end=end)
         schedule.append(block)
 
-    print(f"[Schedule] Built {len(schedule)} blocks from events.")
+    # 按开始时间排序：状态机据此建立时间戳数组，用 np.searchsorted 查找，无需每次重排
+    schedule.sort(key=lambda b: b.start)
+    logger.info("[Schedule] Built %d blocks from events.", len(schedule))
     return schedule
@@ -4,13 +4,20 @@ from __future__ import annotations
 from dataclasses import dataclass
 from enum import Enum, auto
 from datetime import datetime
-from typing import List, Optional
+from typing import List, Optional, Tuple
+import logging
+import random
+import threading
+import time
 
+import numpy as np
 from robot_hat import Music
 
 from .google_calendar import ScheduledBlock
 from .box import BoxHardware
 
+logger = logging.getLogger(__name__)
+
 
 class Mode(Enum):
     IDLE = auto()
@@ -41,9 +48,9 @@ class FocusBoxStateMachine:
     Scheduler-driven state machine:
       - When entering FOCUS/SLEEP:
           1) prompt user to place phone (loop sound)
-          2) wait until box.is_phone_present() is True
+          2) wait until the box reports the phone present (non-blocking read)
           3) play success sound
-          4) box.lock()
+          4) box.lock_async() (motors run while the sound plays)
       - When leaving event (IDLE):
           box.unlock() + play unlock sound
       - EMERGENCY:
@@ -60,6 +67,10 @@ class FocusBoxStateMachine:
         unlock_sfx_path: str = "../musics/unlock.mp3",
         # Timing
         phone_poll_period_s: float = 1.0,
+        phone_poll_max_period_s: float = 10.0,
+        phone_poll_fast_window_s: float = 30.0,
+        phone_reading_max_age_s: float = 2.0,
+        lock_verify_period_s: float = 30.0,
         # Behavior
         require_phone_for_lock: bool = True,
     ):
@@ -71,12 +82,36 @@ class FocusBoxStateMachine:
         self.unlock_sfx_path = unlock_sfx_path
 
         self.phone_poll_period_s = max(0.1, phone_poll_period_s)
+        self.phone_poll_max_period_s = max(self.phone_poll_period_s, phone_poll_max_period_s)
+        self.phone_poll_fast_window_s = max(0.0, phone_poll_fast_window_s)
+        self.phone_reading_max_age_s = phone_reading_max_age_s
+        self.lock_verify_period_s = max(0.0, lock_verify_period_s)
         self.require_phone_for_lock = require_phone_for_lock
 
         self.state = State()
-        self._last_phone_check_ts: Optional[datetime] = None
+        # Polling intervals use time.monotonic() (immune to NTP/DST jumps);
+        # wall-clock time is only used against the calendar schedule.
+        self._last_phone_check_mono: Optional[float] = None
+        # Backoff for phone polling while in WAIT_PHONE
+        self._wait_started_mono: Optional[float] = None
+        self._n_slow_polls = 0
+        self._phone_poll_interval_s = self.phone_poll_period_s
+        # Last time the LOCKED gate checked that the box is really locked
+        self._lock_verified_mono: Optional[float] = None
         self._wait_music_playing = False
 
+        # Index over the last schedule seen (rebuilt only when the list changes):
+        # POSIX timestamps of block start/end, plus running max of end.
+        self._indexed_schedule: Optional[List[ScheduledBlock]] = None
+        self._start_ts = np.empty(0, dtype=np.float64)
+        self._end_ts = np.empty(0, dtype=np.float64)
+        self._reach_ts = np.empty(0, dtype=np.float64)
+
+        # Main loop sleeps on this; set() wakes it immediately (emergency button)
+        self._wake = threading.Event()
+        # Set from the GPIO interrupt thread; handled by update() on the main thread
+        self._emergency_requested = threading.Event()
+
     # ---------- external API ----------
 
     def update(self, now: datetime, schedule: List[ScheduledBlock]):
@@ -86,11 +121,17 @@ class FocusBoxStateMachine:
           - transitions mode
           - runs phone-gate + lock logic
         """
+        if self._emergency_requested.is_set():
+            self._emergency_requested.clear()
+            self.emergency_unlock()
+
         if self.state.mode == Mode.EMERGENCY:
             # In emergency, we do nothing except remain unlocked.
             return
 
-        active, _nxt = self._find_current_and_next(now, schedule)
+        # Convert once; schedule lookup works on the float timestamp
+        now_ts = now.timestamp()
+        active, _nxt = self._find_current_and_next(now_ts, schedule)
 
         if active is None:
             self._enter_mode(Mode.IDLE, None)
@@ -106,27 +147,75 @@ class FocusBoxStateMachine:
 
         # If we are in FOCUS/SLEEP, run the gate logic
         if self.state.mode in (Mode.FOCUS, Mode.SLEEP):
-            self._handle_phone_gate(now)
+            self._handle_phone_gate()
+
+    def request_emergency_unlock(self):
+        """
+        Hardware button interrupt calls this (any thread). Only flags the
+        request and wakes the main loop; the next update() runs
+        emergency_unlock() on the main thread.
+        """
+        self._emergency_requested.set()
+        self.wake()
 
     def emergency_unlock(self):
         """
-        Hardware button can call this.
+        Unlock immediately and stay unlocked. Must run on the thread that
+        calls update(); other threads use request_emergency_unlock().
         """
-        print("[State] EMERGENCY UNLOCK triggered!")
+        logger.warning("[State] EMERGENCY UNLOCK triggered!")
         self._stop_wait_music()
         self.box.unlock()
         self.state.mode = Mode.EMERGENCY
         self.state.active_block = None
         self.state.gate = GateState.WAIT_PHONE
+        self.wake()
+
+    def next_wake_seconds(self, now: datetime, schedule: List[ScheduledBlock]) -> float:
+        """
+        How long the main loop may sleep before the next update() is needed:
+          - WAIT_PHONE in FOCUS/SLEEP: next sensor poll (see _next_poll_interval)
+          - LOCKED in FOCUS/SLEEP: next lock re-check (lock_verify_period_s)
+          - otherwise: at most 60s
+        Never sleeps past the next schedule boundary (block start/end).
+        """
+        period = 60.0
+        if self.state.mode in (Mode.FOCUS, Mode.SLEEP):
+            if self.state.gate == GateState.WAIT_PHONE:
+                period = self._phone_poll_interval_s
+                if self._last_phone_check_mono is not None:
+                    period -= time.monotonic() - self._last_phone_check_mono
+            elif self._lock_verified_mono is not None:
+                since = time.monotonic() - self._lock_verified_mono
+                period = min(period, self.lock_verify_period_s - since)
+        return max(0.0, min(period, self._seconds_to_next_boundary(now.timestamp(), schedule)))
+
+    def wait(self, timeout: float) -> bool:
+        """
+        Sleep up to `timeout` seconds, returning early if wake() is called.
+        Returns True if woken early.
+        """
+        woken = self._wake.wait(timeout=timeout)
+        self._wake.clear()
+        return woken
+
+    def wake(self):
+        """
+        Wake the main loop immediately. Safe from other threads, but not from
+        a signal handler (Event uses a non-reentrant lock).
+        """
+        self._wake.set()
 
     # ---------- core logic ----------
 
-    def _handle_phone_gate(self, now: datetime):
+    def _handle_phone_gate(self):
         """
         Gate logic:
           - WAIT_PHONE: play waiting audio (loop) + poll sensor
           - LOCKED: ensure box remains locked (optional)
         """
+        mono = time.monotonic()
+
         if not self.require_phone_for_lock:
             # Immediately lock when mode active
             if not self.box.is_locked:
@@ -135,38 +224,71 @@ class FocusBoxStateMachine:
                 self.state.gate = GateState.LOCKED
             return
 
-        # If already locked, nothing to do
+        # If already locked, only re-check every lock_verify_period_s
         if self.state.gate == GateState.LOCKED:
+            if (self._lock_verified_mono is not None
+                    and mono - self._lock_verified_mono < self.lock_verify_period_s):
+                return
+            self._lock_verified_mono = mono
             if not self.box.is_locked:
-                # If something unlocked it unexpectedly, re-lock (optional)
-                self.box.lock()
+                # If something unlocked it unexpectedly, re-lock (optional).
+                # Also covers the lock still running in the background: no-op then.
+                self.box.lock_async()
             return
 
         # WAIT_PHONE state:
         self._start_wait_music()
 
-        # Rate-limit sensor polling
-        if self._last_phone_check_ts is not None:
-            dt = (now - self._last_phone_check_ts).total_seconds()
-            if dt < self.phone_poll_period_s:
-                return
-
-        self._last_phone_check_ts = now
-
-        present = False
-        try:
-            present = self.box.is_phone_present()
-        except Exception as e:
-            print(f"[PhoneDetect] error: {e}")
+        # Rate-limit sensor polling (with backoff). The read itself runs on the
+        # box's sensor thread if started, so this never blocks on the sensor.
+        if self._wait_started_mono is None:
+            self._wait_started_mono = mono
+        due = (self._last_phone_check_mono is None
+               or mono - self._last_phone_check_mono >= self._phone_poll_interval_s)
+
+        if due:
+            self._last_phone_check_mono = mono
+            self._phone_poll_interval_s = self._next_poll_interval(mono)
+            try:
+                self.box.request_phone_reading()
+            except Exception as e:
+                logger.error("[PhoneDetect] error: %s", e)
+
+        present, age = self.box.is_phone_present_nonblocking()
+        if present is None or age > self.phone_reading_max_age_s:
+            # No fresh reading -> unknown, keep waiting
+            return
 
         if present:
-            print("[PhoneDetect] Phone detected -> locking")
+            logger.info("[PhoneDetect] Phone detected -> locking")
             self._stop_wait_music()
             self._play_sfx(self.placed_sfx_path)
 
-            # Lock using motors
-            self.box.lock()
+            # Lock using motors, concurrently with the "placed" sound
+            self.box.lock_async()
             self.state.gate = GateState.LOCKED
+            self._lock_verified_mono = mono
+
+    def _next_poll_interval(self, mono: float) -> float:
+        """
+        Poll at phone_poll_period_s for the first phone_poll_fast_window_s of
+        WAIT_PHONE (user is likely placing the phone right now), then back off
+        exponentially up to phone_poll_max_period_s, with +-20% jitter.
+        """
+        waited = mono - self._wait_started_mono
+        if waited < self.phone_poll_fast_window_s:
+            return self.phone_poll_period_s
+
+        self._n_slow_polls += 1
+        period = min(self.phone_poll_max_period_s,
+                     self.phone_poll_period_s * 2 ** min(self._n_slow_polls, 6))
+        return period * random.uniform(0.8, 1.2)
+
+    def _reset_phone_poll(self):
+        self._last_phone_check_mono = None
+        self._wait_started_mono = None
+        self._n_slow_polls = 0
+        self._phone_poll_interval_s = self.phone_poll_period_s
 
     # ---------- transitions ----------
 
@@ -174,7 +296,7 @@ class FocusBoxStateMachine:
         if mode == self.state.mode and block == self.state.active_block:
             return
 
-        print(f"[State] {self.state.mode.name} → {mode.name}")
+        logger.info("[State] %s → %s", self.state.mode.name, mode.name)
 
         # leaving FOCUS/SLEEP -> stop wait music
         if self.state.mode in (Mode.FOCUS, Mode.SLEEP) and mode == Mode.IDLE:
@@ -185,6 +307,7 @@ class FocusBoxStateMachine:
 
         if mode == Mode.IDLE:
             # Unlock and play unlock sound (only if actually locked)
+            self.box.wait_lock_done()
             if self.box.is_locked:
                 self.box.unlock()
                 self._play_sfx(self.unlock_sfx_path)
@@ -194,7 +317,7 @@ class FocusBoxStateMachine:
             # Entering a lock-requiring period:
             # start gate as WAIT_PHONE (will lock when detected)
             self.state.gate = GateState.WAIT_PHONE
-            self._last_phone_check_ts = None
+            self._reset_phone_poll()
 
         elif mode == Mode.EMERGENCY:
             self._stop_wait_music()
@@ -203,17 +326,53 @@ class FocusBoxStateMachine:
 
     # ---------- schedule helpers ----------
 
-    def _find_current_and_next(self, now: datetime, schedule: List[ScheduledBlock]):
-        active = None
-        nxt = None
-        for block in sorted(schedule, key=lambda b: b.start):
-            if block.start <= now < block.end:
-                active = block
-            elif block.start > now:
-                nxt = block
-                break
+    def _index_schedule(self, schedule: List[ScheduledBlock]):
+        """
+        Cache block start/end as timestamp arrays for searchsorted. Expects
+        schedule sorted by start (build_schedule does this); only rebuilt when
+        a new list is passed.
+        """
+        if schedule is self._indexed_schedule:
+            return
+        self._indexed_schedule = schedule
+        self._start_ts = np.array([b.start.timestamp() for b in schedule], dtype=np.float64)
+        self._end_ts = np.array([b.end.timestamp() for b in schedule], dtype=np.float64)
+        self._reach_ts = np.maximum.accumulate(self._end_ts) if len(schedule) else self._end_ts
+
+    def _locate(self, now_ts: float, schedule: List[ScheduledBlock]) -> Tuple[int, int]:
+        """
+        Returns (active index or -1, next index or -1).
+        """
+        self._index_schedule(schedule)
+
+        # Last block starting at or before now; the one after it is next.
+        idx = int(np.searchsorted(self._start_ts, now_ts, side="right")) - 1
+        nxt = idx + 1 if idx + 1 < len(schedule) else -1
+
+        active = -1
+        if idx >= 0 and now_ts < self._reach_ts[idx]:
+            # Some block up to idx still runs; prefer the latest-starting one
+            # (same pick as a linear scan when blocks overlap).
+            for i in range(idx, -1, -1):
+                if now_ts < self._end_ts[i]:
+                    active = i
+                    break
         return active, nxt
 
+    def _find_current_and_next(self, now_ts: float, schedule: List[ScheduledBlock]):
+        active, nxt = self._locate(now_ts, schedule)
+        return (schedule[active] if active >= 0 else None,
+                schedule[nxt] if nxt >= 0 else None)
+
+    def _seconds_to_next_boundary(self, now_ts: float, schedule: List[ScheduledBlock]) -> float:
+        active, nxt = self._locate(now_ts, schedule)
+        edge = float("inf")
+        if active >= 0:
+            edge = float(self._end_ts[active])
+        if nxt >= 0:
+            edge = min(edge, float(self._start_ts[nxt]))
+        return edge - now_ts
+
     # ---------- audio helpers ----------
 
     def _start_wait_music(self):
@@ -222,9 +381,9 @@ class FocusBoxStateMachine:
         try:
             self.music.music_play(self.wait_music_path)
             self._wait_music_playing = True
-            print(f"[Music] waiting loop: {self.wait_music_path}")
+            logger.debug("[Music] waiting loop: %s", self.wait_music_path)
         except Exception as e:
-            print(f"[Music] cannot play wait music: {e}")
+            logger.warning("[Music] cannot play wait music: %s", e)
 
     def _stop_wait_music(self):
         if not self._wait_music_playing:
@@ -232,7 +391,7 @@ class FocusBoxStateMachine:
         try:
             self.music.music_stop()
         except Exception as e:
-            print(f"[Music] cannot stop wait music: {e}")
+            logger.warning("[Music] cannot stop wait music: %s", e)
         self._wait_music_playing = False
 
     def _play_sfx(self, path: str):
@@ -245,6 +404,6 @@ class FocusBoxStateMachine:
             return
         try:
             self.music.music_play(path)
-            print(f"[Music] sfx: {path}")
+            logger.debug("[Music] sfx: %s", path)
         except Exception as e:
-            print(f"[Music] cannot play sfx {path}: {e}")
+            logger.warning("[Music] cannot play sfx %s: %s", path, e)
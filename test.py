@@ -1,4 +1,5 @@
 from datetime import datetime, timedelta
+import logging
 
 from dateutil.tz import gettz
 
@@ -42,6 +43,9 @@ def print_schedule(schedule):
 
 
 def main():
+    # Show focusbox INFO logs ([Google] / [Schedule] messages)
+    logging.basicConfig(level=logging.INFO)
+
     # Use local timezone from config
     tz = gettz(LOCAL_TZ)
 